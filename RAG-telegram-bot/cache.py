@@ -0,0 +1,154 @@
+"""
+Answer cache for the contextual bot: LRU eviction, TTL, a memory cap and
+hit/miss stats, with an optional semantic layer for near-duplicate questions.
+"""
+
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Normalize case and whitespace so trivially different phrasings share an entry."""
+    return _WHITESPACE_RE.sub(" ", question.strip().lower())
+
+
+class SmartCache:
+    """
+    Async-safe LRU + TTL cache keyed by sha256(normalized question).
+
+    When `embed` is given (text -> L2-normalized vector), a miss on the exact key
+    falls back to cosine similarity against the cached questions and accepts the
+    best match above `similarity_threshold`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_bytes: int = 100 * 1024 * 1024,
+        ttl: float = 3600,
+        sizeof: Callable[[Any], int] = lambda value: len(repr(value)),
+        embed: Optional[Callable[[str], Any]] = None,
+        similarity_threshold: float = 0.95,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._sizeof = sizeof
+        self._embed = embed
+
+        # key -> (expires_at, size_bytes, value, embedding or None)
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = asyncio.Lock()
+
+        # Query embeddings computed on a miss, reused by the following set()
+        self._pending_embeddings: OrderedDict = OrderedDict()
+        # Stacked embeddings of live entries, rebuilt lazily after changes
+        self._matrix = None
+        self._matrix_keys: list = []
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(question: str) -> str:
+        return hashlib.sha256(normalize_question(question).encode()).hexdigest()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.semantic_hits + self.misses
+        return (self.hits + self.semantic_hits) / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hit_rate, 3),
+        }
+
+    async def get(self, question: str) -> Optional[Any]:
+        """Return the cached value for question (exact, then semantic), or None."""
+        key = self.key(question)
+        async with self._lock:
+            value = self._get_exact(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        if self._embed is not None:
+            embedding = await asyncio.to_thread(self._embed, normalize_question(question))
+            async with self._lock:
+                self._pending_embeddings[key] = embedding
+                while len(self._pending_embeddings) > 64:
+                    self._pending_embeddings.popitem(last=False)
+                value = self._get_similar(embedding)
+            if value is not None:
+                self.semantic_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, question: str, value: Any) -> None:
+        key = self.key(question)
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        async with self._lock:
+            embedding = self._pending_embeddings.pop(key, None)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value, embedding)
+            self._bytes += size
+            self._matrix = None
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _get_exact(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry[2]
+
+    def _get_similar(self, embedding: Any) -> Optional[Any]:
+        # numpy is only needed (and only imported) when the semantic layer is on
+        import numpy as np
+
+        if self._matrix is None:
+            self._matrix_keys = [k for k, e in self._entries.items() if e[3] is not None]
+            if not self._matrix_keys:
+                return None
+            self._matrix = np.stack([self._entries[k][3] for k in self._matrix_keys])
+
+        # Embeddings are L2-normalized, so the dot product is the cosine similarity
+        sims = self._matrix @ np.asarray(embedding)
+        keys = self._matrix_keys
+        above = np.flatnonzero(sims >= self.similarity_threshold)
+        # Best match first; an expired or evicted entry is skipped and the next one
+        # tried. _get_exact removes expired entries, which drops the matrix so the
+        # next lookup rebuilds it without their rows.
+        for row in above[np.argsort(sims[above])[::-1]]:
+            value = self._get_exact(keys[row])
+            if value is not None:
+                return value
+        return None
+
+    def _remove(self, key: str) -> None:
+        _, size, _, _ = self._entries.pop(key)
+        self._bytes -= size
+        self._matrix = None
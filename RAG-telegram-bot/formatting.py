@@ -0,0 +1,207 @@
+"""
+Telegram HTML formatting for the contextual bot: escaping, citation/bullet
+conversion, source footer, message splitting and TTS text cleanup.
+
+Pure string code on the per-message hot path, fully annotated so it can be
+compiled with mypyc (`mypyc formatting.py` in this directory); the bot imports
+the compiled extension automatically when it is present.
+"""
+
+import bisect
+import functools
+import re
+
+_CITATION_RE = re.compile(r"\[(\d+)\]")
+# Citations and markdown bullets in one scan; dispatched in _format_match
+_FORMAT_RE = re.compile(r"\[(\d+)\]|^[-*] (.+)$", re.MULTILINE)
+_NUM_PREFIX_RE = re.compile(r"^\d+[\s_]+")
+_NEWLINE_RE = re.compile(r"\n")
+
+_ESCAPE_TABLE = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#x27;",
+})
+
+
+def escape_html(text: object) -> str:
+    """Same output as html.escape, done as a single translate pass."""
+    return str(text).translate(_ESCAPE_TABLE)
+
+
+def _format_match(match: "re.Match[str]") -> str:
+    """[N] -> monospace citation, '- item' -> '• item' (citations inside kept)."""
+    num = match.group(1)
+    if num is not None:
+        return f"<code>[{num}]</code>"
+    return "• " + _CITATION_RE.sub(r"<code>[\1]</code>", match.group(2))
+
+
+def format_answer(answer: str) -> str:
+    """Escape for HTML, then convert [N] citations and markdown bullets in one pass."""
+    return _FORMAT_RE.sub(_format_match, escape_html(answer))
+
+
+class IncrementalFormatter:
+    """
+    format_answer for a streamed answer, fed one delta at a time.
+
+    Citations and bullets never span a newline, so completed lines are
+    formatted once and kept; only the trailing partial line is re-formatted
+    on each render().
+    """
+
+    def __init__(self, max_chars: int) -> None:
+        self.max_chars = max_chars
+        self._done: list[str] = []
+        self._tail = ""
+        self._fed = 0
+
+    def feed(self, delta: str) -> None:
+        """Append a delta; text past max_chars is dropped (preview only)."""
+        room = self.max_chars - self._fed
+        if room <= 0:
+            return
+        delta = delta[:room]
+        self._fed += len(delta)
+        text = self._tail + delta
+        cut = text.rfind("\n") + 1
+        if cut:
+            self._done.append(format_answer(text[:cut]))
+            text = text[cut:]
+        self._tail = text
+
+    def render(self) -> str:
+        return "".join(self._done) + format_answer(self._tail)
+
+
+@functools.lru_cache(maxsize=256)
+def clean_doc_name(doc_name: str) -> str:
+    """Strip numeric prefixes from document titles. Titles repeat across queries, so memoize."""
+    return _NUM_PREFIX_RE.sub("", doc_name).strip()
+
+
+def _source_entry(item: dict) -> tuple[str, object]:
+    """(escaped document name, page) for one retrieval item."""
+    # Try ctxl_metadata first, then top-level fields
+    meta = item.get("ctxl_metadata", {})
+    doc_name = (
+        meta.get("document_title")
+        or item.get("doc_name")
+        or "Unknown document"
+    )
+    page = meta.get("page") or item.get("page") or "?"
+    return escape_html(clean_doc_name(doc_name)), page
+
+
+def format_response(data: dict) -> str:
+    """
+    Format the Contextual AI response into a Telegram HTML message.
+    Includes the answer and a source footer.
+    """
+    answer = data.get("message", {}).get("content", "No answer returned.")
+    retrieval = data.get("retrieval_contents", [])
+
+    # Answer and footer fragments are joined once at the end
+    parts: list[str] = [format_answer(answer)]
+
+    # Build source footer from retrieval_contents (first entry per number wins)
+    if retrieval:
+        try:
+            nums = [int(item.get("number")) for item in retrieval]
+        except (TypeError, ValueError):
+            nums = []
+        entries: list = []
+        if nums and min(nums) >= 0 and max(nums) <= 4 * len(nums):
+            # Citation numbers are dense 1..N: index a list by number, which
+            # also yields them in order without a sort
+            slots: list = [None] * (max(nums) + 1)
+            for num, item in zip(nums, retrieval):
+                if slots[num] is None:
+                    slots[num] = _source_entry(item)
+            entries = [(num, entry) for num, entry in enumerate(slots) if entry is not None]
+        else:
+            seen: dict = {}
+            for item in retrieval:
+                num = item.get("number", "?")
+                if num not in seen:
+                    seen[num] = _source_entry(item)
+            entries = sorted(seen.items())
+
+        parts.append("\n\n<b>📚 Sources</b>")
+        for num, (name, page) in entries:
+            parts.append(f"\n  <code>[{num}]</code> {name} — p.{page}")
+
+    return "".join(parts)
+
+
+def split_message(text: str, max_len: int = 4000) -> list[str]:
+    """Split long messages to fit Telegram's 4096-char limit."""
+    if len(text) <= max_len:
+        return [text]
+    # Newline positions are found once; each split point is then a bisect
+    # instead of an rfind over the next max_len chars
+    newlines = [m.start() for m in _NEWLINE_RE.finditer(text)]
+    spans: list[tuple[int, int]] = []
+    start, n = 0, len(text)
+    while n - start > max_len:
+        # Last newline at or before start + max_len (a chunk may be exactly max_len)
+        idx = bisect.bisect_right(newlines, start + max_len) - 1
+        if idx >= 0 and newlines[idx] >= start:
+            split_at = newlines[idx]
+        else:
+            split_at = start + max_len
+        if split_at > start:
+            spans.append((start, split_at))
+        start = split_at
+        while start < n and text[start] == "\n":
+            start += 1
+    if start < n:
+        spans.append((start, n))
+    return [text[i:j] for i, j in spans]
+
+
+def truncate_html(text: str, max_len: int) -> str:
+    """
+    First split_message chunk of formatted HTML, never ending inside a tag, an
+    entity or an open <code> citation (Telegram rejects the whole edit otherwise).
+    """
+    head = split_message(text, max_len)[0]
+    if len(head) == len(text):
+        return head
+    for opener, closer in (("<code>", "</code>"), ("<", ">"), ("&", ";")):
+        cut = head.rfind(opener)
+        if cut > head.rfind(closer):
+            head = head[:cut]
+    return head
+
+
+def strip_for_tts(text: str) -> str:
+    """
+    Drop <tags> and [N] citation markers in one left-to-right scan.
+    Plain runs between markers are copied as slices, not char by char.
+    """
+    out: list[str] = []
+    n = len(text)
+    run_start = i = 0
+    while i < n:
+        c = text[i]
+        if c == "<" and i + 1 < n and text[i + 1] != ">":
+            end = text.find(">", i + 1)
+            if end != -1:
+                out.append(text[run_start:i])
+                i = run_start = end + 1
+                continue
+        elif c == "[":
+            j = i + 1
+            while j < n and text[j].isdecimal():
+                j += 1
+            if j > i + 1 and j < n and text[j] == "]":
+                out.append(text[run_start:i])
+                i = run_start = j + 1
+                continue
+        i += 1
+    out.append(text[run_start:])
+    return "".join(out).strip()
@@ -1,19 +1,26 @@
 """Telegram bot powered by Contextual AI agent (replaces local RAG pipeline)."""
 
+import asyncio
+import hashlib
 import io
 import logging
 import os
 import re
-import html
+import sqlite3
 import tempfile
 import time
+import weakref
+from typing import Awaitable, Callable, Optional
 
-import requests
+import httpx
+import orjson
+from cachetools import LRUCache
 from gtts import gTTS
 from deep_translator import GoogleTranslator
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ChatAction, ParseMode
+from telegram.error import TelegramError
 from telegram.ext import (
     Application,
     CallbackQueryHandler,
@@ -23,6 +30,16 @@ from telegram.ext import (
     filters,
 )
 
+from cache import SmartCache
+from formatting import (
+    IncrementalFormatter,
+    escape_html,
+    format_response,
+    split_message,
+    strip_for_tts,
+    truncate_html,
+)
+
 load_dotenv()
 
 # ── Indian language options for TTS ──────────────────────────────────────────
@@ -39,8 +56,56 @@ INDIAN_LANGUAGES = {
     "en": "🌐 English",
 }
 
+
+def _build_lang_keyboard(current: str) -> InlineKeyboardMarkup:
+    """2-column language picker with a checkmark on the current selection."""
+    items = list(INDIAN_LANGUAGES.items())
+    buttons = []
+    for i in range(0, len(items), 2):
+        row = []
+        for code, name in items[i:i+2]:
+            label = f"✅ {name}" if code == current else name
+            row.append(InlineKeyboardButton(label, callback_data=f"lang:{code}"))
+        buttons.append(row)
+    return InlineKeyboardMarkup(buttons)
+
+
+# Only one keyboard per language can ever be shown, so build them all once
+_LANG_KEYBOARDS = {code: _build_lang_keyboard(code) for code in INDIAN_LANGUAGES}
+
 # Per-user preferences: {chat_id: {"lang": "hi", "tts": True}}
-user_prefs: dict[int, dict] = {}
+# Bounded in memory; language choices are persisted to sqlite so they survive
+# restarts and LRU eviction.
+user_prefs: LRUCache = LRUCache(maxsize=10_000)
+PREFS_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prefs.db")
+_prefs_db: Optional[sqlite3.Connection] = None
+
+
+def load_user_prefs() -> None:
+    """Open the prefs database and warm user_prefs from it."""
+    global _prefs_db
+    _prefs_db = sqlite3.connect(PREFS_DB_PATH)
+    _prefs_db.execute("CREATE TABLE IF NOT EXISTS prefs(chat_id INTEGER PRIMARY KEY, lang TEXT)")
+    rows = _prefs_db.execute("SELECT chat_id, lang FROM prefs LIMIT ?", (user_prefs.maxsize,))
+    for chat_id, lang in rows:
+        user_prefs[chat_id] = {"lang": lang}
+
+
+def get_user_lang(chat_id: int) -> str:
+    prefs = user_prefs.get(chat_id)
+    if prefs is None:
+        row = None
+        if _prefs_db is not None:
+            row = _prefs_db.execute("SELECT lang FROM prefs WHERE chat_id = ?", (chat_id,)).fetchone()
+        prefs = user_prefs[chat_id] = {"lang": row[0] if row else "en"}
+    return prefs.get("lang", "en")
+
+
+def set_user_lang(chat_id: int, lang: str) -> None:
+    user_prefs.setdefault(chat_id, {})["lang"] = lang
+    if _prefs_db is not None:
+        _prefs_db.execute("INSERT OR REPLACE INTO prefs VALUES (?, ?)", (chat_id, lang))
+        _prefs_db.commit()
 
 # ── Logging ───────────────────────────────────────────────────────────────────
 logging.basicConfig(
@@ -54,167 +119,253 @@ CONTEXTUAL_API_KEY = os.getenv("CONTEXTUAL_API_KEY")
 CONTEXTUAL_AGENT_ID = os.getenv("CONTEXTUAL_AGENT_ID", "840be60e-c004-4850-8fb9-980a691f431a")
 CONTEXTUAL_BASE_URL = "https://api.contextual.ai/v1"
 
+# Streaming: how often the status message is edited with the partial answer,
+# and how much of it is shown, measured after HTML escaping and citation
+# markup (Telegram caps messages at 4096 chars)
+STREAM_EDIT_INTERVAL = 1.0
+STREAM_PREVIEW_CHARS = 3500
+
+# On-disk MP3 cache keyed by (lang, cleaned answer text)
+TTS_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_cache")
+TTS_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+# Long answers are spoken in parallel sentence batches; the semaphore keeps
+# concurrent Translate/gTTS calls within Google's rate limits
+TTS_BATCH_CHARS = 500
+_TTS_SEMAPHORE = asyncio.Semaphore(4)
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
 
 # ── Contextual AI helpers ────────────────────────────────────────────────────
 
-def get_agent_datastores() -> dict:
+# Built once at import, not per request
+_AUTH_HEADERS = {"Authorization": f"Bearer {CONTEXTUAL_API_KEY}"}
+_AGENT_PATH = f"/agents/{CONTEXTUAL_AGENT_ID}"
+_QUERY_PATH = f"{_AGENT_PATH}/query/acl"
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Transient API failures (rate limits, gateway errors) are retried with
+# exponential backoff; connection failures are retried by the transport
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_MAX_RETRIES = 3
+_RETRY_BACKOFF = 0.3
+
+# One shared async client per application (created in post_init, closed in
+# post_shutdown): pooled keep-alive + HTTP/2, and the event loop stays free to
+# serve other chats while a query is in flight
+def _build_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=CONTEXTUAL_BASE_URL,
+        headers=_AUTH_HEADERS,
+        timeout=60,
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            retries=_MAX_RETRIES,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50),
+        ),
+    )
+
+
+async def _backoff(attempt: int) -> None:
+    await asyncio.sleep(_RETRY_BACKOFF * 2 ** attempt)
+
+
+async def get_agent_datastores(client: httpx.AsyncClient) -> dict:
     """
     Fetch the datastores (document collections) linked to the agent.
     Returns a list of datastore dicts.
     """
-    url = f"{CONTEXTUAL_BASE_URL}/agents/{CONTEXTUAL_AGENT_ID}"
-    headers = {"Authorization": f"Bearer {CONTEXTUAL_API_KEY}"}
-    response = requests.get(url, headers=headers, timeout=30)
+    for attempt in range(_MAX_RETRIES + 1):
+        response = await client.get(_AGENT_PATH, timeout=30)
+        if response.status_code not in _RETRY_STATUSES or attempt == _MAX_RETRIES:
+            break
+        await _backoff(attempt)
     response.raise_for_status()
-    agent_data = response.json()
+    agent_data = orjson.loads(response.content)
     return agent_data
 
 
-def query_contextual_agent(question: str) -> dict:
+def _project_retrieval(items: list) -> list:
     """
-    Send a question to the Contextual AI agent.
-    Returns the full response dict with 'message' and 'retrieval_contents'.
+    Keep only the retrieval fields format_response reads. The API has no
+    field filter and items carry full chunk text, which would otherwise sit
+    in the answer cache for every entry.
     """
-    url = f"{CONTEXTUAL_BASE_URL}/agents/{CONTEXTUAL_AGENT_ID}/query/acl"
-    headers = {
-        "Authorization": f"Bearer {CONTEXTUAL_API_KEY}",
-        "Content-Type": "application/json",
+    projected = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        meta = item.get("ctxl_metadata") or {}
+        projected.append({
+            "number": item.get("number", "?"),
+            "doc_name": item.get("doc_name"),
+            "page": item.get("page"),
+            "ctxl_metadata": {
+                "document_title": meta.get("document_title"),
+                "page": meta.get("page"),
+            },
+        })
+    return projected
+
+
+# Stand-in answer when a stream carries no content; never cached
+_NO_ANSWER = "No answer returned."
+
+
+async def _read_answer_stream(
+    response: httpx.Response,
+    on_delta: Optional[Callable[[str], Awaitable[None]]],
+) -> dict:
+    """Accumulate an SSE answer stream into {'message', 'retrieval_contents'}."""
+    parts: list[str] = []
+    final_content = None
+    retrieval: list = []
+    event_name = ""
+
+    async for line in response.aiter_lines():
+        if line.startswith("event:"):
+            event_name = line[6:].strip()
+            continue
+        if not line.startswith("data:"):
+            continue
+        raw = line[5:].strip()
+        if not raw or raw == "[DONE]":
+            continue
+        event = orjson.loads(raw)
+        # Events arrive either as `event: x` + `data: {...}` or as
+        # `data: {"event": x, "data": {...}}`
+        if isinstance(event, dict) and "event" in event and "data" in event:
+            event_name, event = event["event"], event["data"]
+        if not isinstance(event, dict):
+            continue
+
+        if "retrieval_contents" in event:
+            retrieval = _project_retrieval(event["retrieval_contents"] or [])
+        elif "retrieval" in event_name and "contents" in event:
+            retrieval = _project_retrieval(event["contents"] or [])
+
+        delta = event.get("delta")
+        if isinstance(delta, str) and delta:
+            parts.append(delta)
+            if on_delta is not None:
+                await on_delta(delta)
+
+        message = event.get("message")
+        if isinstance(message, dict) and message.get("content"):
+            final_content = message["content"]
+
+    content = final_content if final_content is not None else "".join(parts)
+    return {
+        "message": {"content": content or _NO_ANSWER},
+        "retrieval_contents": retrieval,
     }
-    payload = {
-        "messages": [{"role": "user", "content": question}],
-        "stream": False,
-    }
-    response = requests.post(url, headers=headers, json=payload, timeout=60)
-    response.raise_for_status()
-    return response.json()
-
-
-# ── Formatting ────────────────────────────────────────────────────────────────
 
-def escape_html(text: str) -> str:
-    return html.escape(str(text))
 
-
-def format_response(data: dict) -> str:
+async def query_contextual_agent(
+    client: httpx.AsyncClient,
+    question: str,
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+) -> dict:
     """
-    Format the Contextual AI response into a Telegram HTML message.
-    Includes the answer and a source footer.
+    Send a question to the Contextual AI agent, streaming the answer as SSE.
+    on_delta (if given) is awaited with each answer delta as it arrives.
+    Returns the non-streaming shape: a dict with 'message' and 'retrieval_contents'.
     """
-    answer = data.get("message", {}).get("content", "No answer returned.")
-    retrieval = data.get("retrieval_contents", [])
-
-    # Escape for HTML
-    safe_answer = escape_html(answer)
-
-    # Convert [N] citation markers to monospace
-    safe_answer = re.sub(r'\[(\d+)\]', r'<code>[\1]</code>', safe_answer)
-
-    # Convert markdown bullets to •
-    safe_answer = re.sub(r'(?m)^[-*] (.+)$', r'• \1', safe_answer)
-
-    # Build source footer from retrieval_contents
-    if retrieval:
-        seen = {}
-        for item in retrieval:
-            num = item.get("number", "?")
-            # Try ctxl_metadata first, then top-level fields
-            meta = item.get("ctxl_metadata", {})
-            doc_name = (
-                meta.get("document_title")
-                or item.get("doc_name")
-                or "Unknown document"
-            )
-            page = meta.get("page") or item.get("page") or "?"
-            # Clean up numeric prefixes from filenames
-            doc_name = re.sub(r'^\d+[\s_]+', '', doc_name).strip()
-            if num not in seen:
-                seen[num] = (escape_html(doc_name), page)
-
-        source_lines = [
-            f"  <code>[{num}]</code> {name} — p.{page}"
-            for num, (name, page) in sorted(seen.items())
-        ]
-        sources_block = "\n".join(source_lines)
-        footer = f"\n\n<b>📚 Sources</b>\n{sources_block}"
-    else:
-        footer = ""
+    body = orjson.dumps({"messages": [{"role": "user", "content": question}], "stream": True})
+    attempt = 0
+    while True:
+        async with client.stream("POST", _QUERY_PATH, content=body, headers=_JSON_HEADERS) as response:
+            if response.status_code not in _RETRY_STATUSES or attempt == _MAX_RETRIES:
+                response.raise_for_status()
+                return await _read_answer_stream(response, on_delta)
+        await _backoff(attempt)
+        attempt += 1
+
+
+# Repeated questions ("What is the Montreal Protocol?") skip the API round-trip
+# Set SEMANTIC_CACHE=1 to also reuse answers for near-duplicate questions
+# (needs sentence-transformers; the query is embedded once with MiniLM)
+def _load_query_embedder() -> Callable[[str], object]:
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    return lambda text: model.encode(text, normalize_embeddings=True)
+
+
+_ANSWER_CACHE = SmartCache(
+    max_entries=512,
+    max_bytes=100 * 1024 * 1024,
+    ttl=3600,
+    sizeof=lambda data: len(orjson.dumps(data)),
+    embed=_load_query_embedder() if os.getenv("SEMANTIC_CACHE") == "1" else None,
+)
 
-    return safe_answer + footer
 
+async def _open_http_client(app: Application) -> None:
+    app.bot_data["http"] = _build_http_client()
 
-def split_message(text: str, max_len: int = 4000) -> list:
-    """Split long messages to fit Telegram's 4096-char limit."""
-    if len(text) <= max_len:
-        return [text]
-    chunks = []
-    while text:
-        if len(text) <= max_len:
-            chunks.append(text)
-            break
-        split_at = text.rfind("\n", 0, max_len)
-        if split_at == -1:
-            split_at = max_len
-        chunks.append(text[:split_at])
-        text = text[split_at:].lstrip("\n")
-    return chunks
+
+async def _close_http_client(app: Application) -> None:
+    await app.bot_data["http"].aclose()
 
 
 # ── Command handlers ──────────────────────────────────────────────────────────
 
+# Static replies are built once at import, not per command
+_START_HTML = (
+    "👋 <b>Hi! I'm a Climate Research Assistant.</b>\n\n"
+    "I can answer questions about:\n"
+    "• Refrigerants &amp; HVAC\n"
+    "• Cooling policies &amp; action plans\n"
+    "• Environmental regulations\n"
+    "• Climate research documents\n\n"
+    "<b>Try asking:</b>\n"
+    "• What is the India Cooling Action Plan?\n"
+    "• What are low-GWP refrigerant alternatives?\n"
+    "• What is the Montreal Protocol?\n\n"
+    "Type any question to get started! 🌍"
+)
+
+_HELP_HTML = (
+    "<b>ℹ️ Commands</b>\n\n"
+    "/start    – Welcome message\n"
+    "/help     – This help message\n"
+    "/sources  – Show connected data sources\n"
+    "/language – Choose voice language for audio replies\n\n"
+    "<b>How it works</b>\n"
+    "1. You type a question\n"
+    "2. The AI searches across climate &amp; HVAC documents\n"
+    "3. You get a cited text answer\n"
+    "4. A voice MP3 is sent in your chosen language\n\n"
+    "Powered by <b>Contextual AI</b> + <b>gTTS</b> 🤖🔊"
+)
+
+_LANG_PROMPT_HTML = (
+    "🔊 <b>Choose your voice language</b>\n"
+    "Audio will be sent after every answer in the selected language."
+)
+
+_FETCHING_SOURCES_HTML = "🔍 <i>Fetching data sources…</i>"
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await update.message.reply_text(
-        "👋 <b>Hi! I'm a Climate Research Assistant.</b>\n\n"
-        "I can answer questions about:\n"
-        "• Refrigerants &amp; HVAC\n"
-        "• Cooling policies &amp; action plans\n"
-        "• Environmental regulations\n"
-        "• Climate research documents\n\n"
-        "<b>Try asking:</b>\n"
-        "• What is the India Cooling Action Plan?\n"
-        "• What are low-GWP refrigerant alternatives?\n"
-        "• What is the Montreal Protocol?\n\n"
-        "Type any question to get started! 🌍",
-        parse_mode=ParseMode.HTML,
-    )
+    await update.message.reply_text(_START_HTML, parse_mode=ParseMode.HTML)
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    await update.message.reply_text(
-        "<b>ℹ️ Commands</b>\n\n"
-        "/start    – Welcome message\n"
-        "/help     – This help message\n"
-        "/sources  – Show connected data sources\n"
-        "/language – Choose voice language for audio replies\n\n"
-        "<b>How it works</b>\n"
-        "1. You type a question\n"
-        "2. The AI searches across climate &amp; HVAC documents\n"
-        "3. You get a cited text answer\n"
-        "4. A voice MP3 is sent in your chosen language\n\n"
-        "Powered by <b>Contextual AI</b> + <b>gTTS</b> 🤖🔊",
-        parse_mode=ParseMode.HTML,
-    )
+    await update.message.reply_text(_HELP_HTML, parse_mode=ParseMode.HTML)
 
 
 async def language_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show inline keyboard to pick TTS language."""
     chat_id = update.effective_chat.id
-    current = user_prefs.get(chat_id, {}).get("lang", "en")
-
-    # Build 2-column keyboard
-    buttons = []
-    items = list(INDIAN_LANGUAGES.items())
-    for i in range(0, len(items), 2):
-        row = []
-        for code, name in items[i:i+2]:
-            label = f"✅ {name}" if code == current else name
-            row.append(InlineKeyboardButton(label, callback_data=f"lang:{code}"))
-        buttons.append(row)
+    current = get_user_lang(chat_id)
 
     await update.message.reply_text(
-        "🔊 <b>Choose your voice language</b>\n"
-        "Audio will be sent after every answer in the selected language.",
+        _LANG_PROMPT_HTML,
         parse_mode=ParseMode.HTML,
-        reply_markup=InlineKeyboardMarkup(buttons),
+        reply_markup=_LANG_KEYBOARDS.get(current, _LANG_KEYBOARDS["en"]),
     )
 
 
@@ -226,24 +377,12 @@ async def language_callback(update: Update, context: ContextTypes.DEFAULT_TYPE)
     lang_code = query.data.split(":")[1]
     lang_name = INDIAN_LANGUAGES.get(lang_code, lang_code)
 
-    user_prefs.setdefault(chat_id, {})["lang"] = lang_code
-
-    # Rebuild keyboard with updated checkmark
-    buttons = []
-    items = list(INDIAN_LANGUAGES.items())
-    for i in range(0, len(items), 2):
-        row = []
-        for code, name in items[i:i+2]:
-            label = f"✅ {name}" if code == lang_code else name
-            row.append(InlineKeyboardButton(label, callback_data=f"lang:{code}"))
-        buttons.append(row)
+    set_user_lang(chat_id, lang_code)
 
     await query.edit_message_text(
-        f"🔊 <b>Choose your voice language</b>\n"
-        f"Audio will be sent after every answer in the selected language.\n\n"
-        f"✅ Now set to: <b>{lang_name}</b>",
+        f"{_LANG_PROMPT_HTML}\n\n✅ Now set to: <b>{lang_name}</b>",
         parse_mode=ParseMode.HTML,
-        reply_markup=InlineKeyboardMarkup(buttons),
+        reply_markup=_LANG_KEYBOARDS.get(lang_code, _LANG_KEYBOARDS["en"]),
     )
 
 
@@ -259,58 +398,168 @@ def translate_text(text: str, target_lang: str) -> str:
         return text  # fall back to English audio
 
 
-def generate_voice(text: str, lang: str) -> io.BytesIO:
-    """Translate text to target language, then convert to MP3 using gTTS."""
-    # Strip HTML tags and citation markers for clean input
-    clean = re.sub(r"<[^>]+>", "", text)
-    clean = re.sub(r"\[(\d+)\]", "", clean).strip()
+def _tts_cache_path(clean: str, lang: str) -> str:
+    key = hashlib.sha256(f"{lang}\0{clean}".encode()).hexdigest()
+    return os.path.join(TTS_CACHE_DIR, f"{key}.mp3")
+
+
+def _prune_tts_cache() -> None:
+    """Delete least-recently-used MP3s once the cache exceeds TTS_CACHE_MAX_BYTES."""
+    entries = []
+    total = 0
+    with os.scandir(TTS_CACHE_DIR) as it:
+        for entry in it:
+            if entry.name.endswith(".mp3"):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+    if total <= TTS_CACHE_MAX_BYTES:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= TTS_CACHE_MAX_BYTES:
+            break
 
-    # Step 1: translate to target language
-    translated = translate_text(clean, lang)
 
-    # Step 2: speak the translated text
+def _tts_batches(clean: str) -> list[str]:
+    """Group sentences into ~TTS_BATCH_CHARS batches (a longer sentence is its own batch)."""
+    batches: list[str] = []
+    current = ""
+    for sentence in _SENTENCE_END_RE.split(clean):
+        if current and len(current) + 1 + len(sentence) > TTS_BATCH_CHARS:
+            batches.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    batches.append(current)
+    return batches
+
+
+def _tts_one(text: str, lang: str) -> tuple[bytes, bool]:
+    """Translate + speak one batch. Returns (mp3 bytes, translated_ok)."""
+    translated = translate_text(text, lang)
     tts = gTTS(text=translated, lang=lang, slow=False)
     buf = io.BytesIO()
     tts.write_to_fp(buf)
-    buf.seek(0)
-    buf.name = "answer.mp3"
-    return buf
+    return buf.getvalue(), lang == "en" or translated != text
+
+
+async def _tts_one_limited(text: str, lang: str) -> tuple[bytes, bool]:
+    async with _TTS_SEMAPHORE:
+        return await asyncio.to_thread(_tts_one, text, lang)
+
+
+def _write_voice_file(parts: list[bytes], cache_path: str, cacheable: bool) -> tuple[str, bool]:
+    """Write MP3 parts to the TTS cache (or a temp file). Returns (path, is_temp)."""
+    if cacheable:
+        try:
+            os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(suffix=".part", dir=TTS_CACHE_DIR)
+        except OSError as e:
+            logger.warning(f"Could not write TTS cache: {e}")
+            cacheable = False
+    if not cacheable:
+        fd, tmp_path = tempfile.mkstemp(suffix=".mp3")
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for part in parts:
+                f.write(part)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    if not cacheable:
+        return tmp_path, True
+    os.replace(tmp_path, cache_path)
+    _prune_tts_cache()
+    return cache_path, False
+
+
+async def generate_voice(text: str, lang: str) -> tuple[str, bool]:
+    """
+    Translate text to target language, then convert to MP3 using gTTS.
+    Long answers are split into sentence batches that are translated and spoken
+    in parallel worker threads; MP3 frames concatenate, so the parts are written
+    back to back into one file.
+    Returns (path, is_temp); the caller deletes the file when is_temp is True.
+    """
+    # Strip HTML tags and citation markers for clean input
+    clean = strip_for_tts(text)
+
+    # Same answer in the same language -> reuse the MP3, no Translate/TTS calls
+    cache_path = _tts_cache_path(clean, lang)
+    if os.path.exists(cache_path):
+        os.utime(cache_path)  # mark as recently used for pruning
+        return cache_path, False
+
+    results = await asyncio.gather(
+        *(_tts_one_limited(batch, lang) for batch in _tts_batches(clean))
+    )
+    parts = [mp3 for mp3, _ in results]
+    # Don't cache English fallback audio from a failed translation
+    cacheable = all(ok for _, ok in results)
+    return await asyncio.to_thread(_write_voice_file, parts, cache_path, cacheable)
+
+
+async def _timed_generate_voice(text: str, lang: str) -> tuple[tuple[str, bool], float]:
+    """generate_voice plus its wall-clock time."""
+    t_start = time.perf_counter()
+    voice = await generate_voice(text, lang)
+    return voice, time.perf_counter() - t_start
+
+
+def format_agent_sources(agent_data: dict) -> str:
+    """Render the agent metadata and its datastores as the /sources reply."""
+    # Agent metadata
+    agent_name = escape_html(agent_data.get("name", "Unknown Agent"))
+    agent_id   = escape_html(agent_data.get("id", CONTEXTUAL_AGENT_ID))
 
+    # Datastores list
+    datastores = agent_data.get("datastore_ids", []) or agent_data.get("datastores", [])
+
+    lines = [f"<b>🤖 Agent:</b> {agent_name}", f"<b>🆔 ID:</b> <code>{agent_id}</code>", ""]
+
+    if datastores:
+        lines.append(f"<b>📂 Connected Datastores ({len(datastores)}):</b>")
+        lines.extend(
+            f"  • <b>{escape_html(ds.get('name', 'Unnamed'))}</b> — <code>{escape_html(str(ds.get('id', '?')))}</code>"
+            if isinstance(ds, dict)
+            else f"  • <code>{escape_html(str(ds))}</code>"
+            for ds in datastores
+        )
+    else:
+        lines.append("⚠️ No datastores found in agent metadata.")
+        lines.append("(Documents may be embedded directly in the agent)")
+
+    return "\n".join(lines)
+
+
+# Rendered /sources reply and when it expires. The agent's datastores only
+# change when someone edits the agent, so a fetch is reused for a few minutes.
+_AGENT_TTL = 300
+_sources_cache: Optional[tuple[float, str]] = None
 
 
 async def sources_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show which datastores are connected to the Contextual AI agent."""
-    status_msg = await update.message.reply_text(
-        "🔍 <i>Fetching data sources…</i>", parse_mode=ParseMode.HTML
-    )
-    try:
-        agent_data = get_agent_datastores()
-
-        # Agent metadata
-        agent_name = escape_html(agent_data.get("name", "Unknown Agent"))
-        agent_id   = escape_html(agent_data.get("id", CONTEXTUAL_AGENT_ID))
-
-        # Datastores list
-        datastores = agent_data.get("datastore_ids", []) or agent_data.get("datastores", [])
-
-        lines = [f"<b>🤖 Agent:</b> {agent_name}", f"<b>🆔 ID:</b> <code>{agent_id}</code>", ""]
-
-        if datastores:
-            lines.append(f"<b>📂 Connected Datastores ({len(datastores)}):</b>")
-            for ds in datastores:
-                if isinstance(ds, dict):
-                    ds_id   = escape_html(str(ds.get("id", "?")))
-                    ds_name = escape_html(ds.get("name", "Unnamed"))
-                    lines.append(f"  • <b>{ds_name}</b> — <code>{ds_id}</code>")
-                else:
-                    lines.append(f"  • <code>{escape_html(str(ds))}</code>")
-        else:
-            lines.append("⚠️ No datastores found in agent metadata.")
-            lines.append("(Documents may be embedded directly in the agent)")
+    global _sources_cache
+    if _sources_cache is not None and _sources_cache[0] > time.monotonic():
+        await update.message.reply_text(_sources_cache[1], parse_mode=ParseMode.HTML)
+        return
 
-        await status_msg.edit_text("\n".join(lines), parse_mode=ParseMode.HTML)
+    status_msg = await update.message.reply_text(_FETCHING_SOURCES_HTML, parse_mode=ParseMode.HTML)
+    try:
+        agent_data = await get_agent_datastores(context.bot_data["http"])
+        sources_html = format_agent_sources(agent_data)
+        _sources_cache = (time.monotonic() + _AGENT_TTL, sources_html)
+        await status_msg.edit_text(sources_html, parse_mode=ParseMode.HTML)
 
-    except requests.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         logger.error(f"Error fetching agent info: {e}")
         await status_msg.edit_text(
             f"⚠️ <b>API Error:</b> {escape_html(str(e))}",
@@ -324,12 +573,32 @@ async def sources_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
 
 
+# Updates are processed concurrently (see main), so a slow answer in one chat
+# no longer blocks the others; this per-chat lock keeps each chat's questions
+# answered in the order they were sent. Entries vanish once no handler holds them.
+_chat_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Core handler: query Contextual AI → format → reply → voice."""
     question = update.message.text.strip()
     if not question:
         return
 
+    lock = _chat_locks.setdefault(update.effective_chat.id, asyncio.Lock())
+    async with lock:
+        await _answer_question(update, context, question)
+
+
+async def _send_typing(chat) -> None:
+    """Best-effort TYPING indicator; a failure must not abort the query it accompanies."""
+    try:
+        await chat.send_action(ChatAction.TYPING)
+    except TelegramError as e:
+        logger.debug(f"Typing indicator skipped: {e}")
+
+
+async def _answer_question(update: Update, context: ContextTypes.DEFAULT_TYPE, question: str) -> None:
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
     t_total_start = time.perf_counter()
@@ -341,40 +610,73 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     )
 
     try:
-        await update.message.chat.send_action(ChatAction.TYPING)
-        await status_msg.edit_text(
-            "⚙️ <i>Generating answer…</i>",
-            parse_mode=ParseMode.HTML,
-        )
-
         # ── Contextual AI latency ──────────────────────────────────────────────
         t_api_start = time.perf_counter()
-        data = query_contextual_agent(question)
+        data = await _ANSWER_CACHE.get(question)
+        if data is None:
+            last_edit = 0.0
+            preview = IncrementalFormatter(STREAM_PREVIEW_CHARS)
+
+            async def show_partial(delta: str) -> None:
+                # Throttled: Telegram rate-limits edits to the same message
+                nonlocal last_edit
+                preview.feed(delta)
+                now = time.monotonic()
+                if now - last_edit < STREAM_EDIT_INTERVAL:
+                    return
+                last_edit = now
+                try:
+                    text = truncate_html(preview.render(), STREAM_PREVIEW_CHARS)
+                    await status_msg.edit_text(text + " ▌", parse_mode=ParseMode.HTML)
+                except TelegramError as e:
+                    logger.debug(f"Partial answer edit skipped: {e}")
+
+            # TYPING goes out concurrently with the query, not in front of it
+            data, _ = await asyncio.gather(
+                query_contextual_agent(context.bot_data["http"], question, on_delta=show_partial),
+                _send_typing(update.message.chat),
+            )
+            # Empty, truncated or unrecognised streams are shown but not cached
+            if data["message"]["content"] != _NO_ANSWER and data["retrieval_contents"]:
+                await _ANSWER_CACHE.set(question, data)
+        else:
+            logger.info(f"Answer cache hit for {user_id} | {_ANSWER_CACHE.stats()}")
         t_api_end = time.perf_counter()
         api_latency = t_api_end - t_api_start
 
-        reply = format_response(data)
-        await status_msg.delete()
+        # Escaping/regex work runs off the event loop so other chats keep flowing
+        reply = await asyncio.to_thread(format_response, data)
 
-        for chunk in split_message(reply):
-            await update.message.reply_text(chunk, parse_mode=ParseMode.HTML)
+        # Start translate + TTS (in worker threads) now, so it overlaps with
+        # sending the text chunks instead of running after them
+        lang = get_user_lang(chat_id)
+        tts_task = asyncio.create_task(_timed_generate_voice(reply, lang))
+
+        try:
+            await status_msg.delete()
+            for chunk in split_message(reply):
+                await update.message.reply_text(chunk, parse_mode=ParseMode.HTML)
+        except BaseException:
+            tts_task.cancel()
+            raise
 
         # ── TTS latency ────────────────────────────────────────────────────────
-        lang = user_prefs.get(chat_id, {}).get("lang", "en")
         tts_latency = 0.0
         try:
             await update.message.chat.send_action(ChatAction.UPLOAD_VOICE)
-            t_tts_start = time.perf_counter()
-            voice_buf = generate_voice(reply, lang)
-            t_tts_end = time.perf_counter()
-            tts_latency = t_tts_end - t_tts_start
+            (voice_path, is_temp), tts_latency = await tts_task
             lang_name = INDIAN_LANGUAGES.get(lang, lang)
-            await update.message.reply_audio(
-                audio=voice_buf,
-                filename="answer.mp3",
-                title=f"Answer ({lang_name})",
-                performer="Climate AI",
-            )
+            try:
+                with open(voice_path, "rb") as audio:
+                    await update.message.reply_audio(
+                        audio=audio,
+                        filename="answer.mp3",
+                        title=f"Answer ({lang_name})",
+                        performer="Climate AI",
+                    )
+            finally:
+                if is_temp:
+                    os.unlink(voice_path)
         except Exception as tts_err:
             logger.warning(f"TTS failed (non-fatal): {tts_err}")
             await update.message.reply_text(
@@ -401,7 +703,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             parse_mode=ParseMode.HTML,
         )
 
-    except requests.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         logger.error(f"Contextual AI API error: {e}")
         await status_msg.edit_text(
             f"⚠️ <b>API Error:</b> {escape_html(str(e))}\n\nCheck your API key and agent ID.",
@@ -425,8 +727,16 @@ def main() -> None:
         raise ValueError("CONTEXTUAL_API_KEY not set in .env")
 
     logger.info(f"Using Contextual AI agent: {CONTEXTUAL_AGENT_ID}")
-
-    app = Application.builder().token(token).build()
+    load_user_prefs()
+
+    app = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(True)
+        .post_init(_open_http_client)
+        .post_shutdown(_close_http_client)
+        .build()
+    )
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("help", help_command))
     app.add_handler(CommandHandler("sources", sources_command))
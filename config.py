@@ -1,5 +1,7 @@
 """Prompts, model settings, and constants."""
 
+import os
+
 # LLM
 LLM_MODEL = "llama-3.3-70b-versatile"
 LLM_TEMPERATURE = 0.2
@@ -10,6 +12,12 @@ LLM_TOP_P = 0.9
 RETRIEVAL_TOP_K = 5
 RETRIEVAL_CANDIDATE_K = 20  # candidates fetched before reranking
 
+# Semantic result cache: hybrid_search reuses results for a query whose embedding
+# is at least this cosine-similar to a recent one. Opt-in with SEMANTIC_CACHE=1, as in
+# the Telegram bot; off by default so evals score every question on its own retrieval.
+SEMANTIC_CACHE_SIZE = 128 if os.getenv("SEMANTIC_CACHE") == "1" else 0
+SEMANTIC_CACHE_THRESHOLD = 0.97
+
 # System prompt
 SYSTEM_PROMPT = """You are a research assistant. Answer the question using ONLY information explicitly stated in the provided sources.
 
@@ -1,111 +1,77 @@
 """Renders the answer + source cards as an HTML block for Streamlit."""
 
+import functools
 import re
 import html as html_lib
+from string import Template
 
+# Compiled once at import; build_answer_html runs on every query.
+# MARKUP_RE handles bold, bullets, numbered items and [N] citations in one scan.
+MARKUP_RE = re.compile(
+    r'\*\*(?P<bold>.+?)\*\*'
+    r'|^[-*] (?P<item>.+)$'
+    r'|^\d+\. (?P<numbered>.+)$'
+    r'|\[(?P<cite>\d+)\]',
+    re.MULTILINE,
+)
+BOLD_RE = re.compile(r'\*\*(.+?)\*\*')
+CITE_RE = re.compile(r'\[(\d+)\]')
+UL_WRAP_RE = re.compile(r'((?:<li>.*?</li>\n?)+)')
 
-def build_answer_html(answer_text: str, results: list) -> str:
-    """Return a full HTML document with the answer, clickable [N] citations, and collapsible source cards."""
-
-    # Build source data
-    sources = []
-    for i, result in enumerate(results, 1):
-        meta = result['metadata']
-        display_name = meta['filename'].replace('.pdf', '').replace('_', ' ').replace('-', ' ')
-        sources.append({
-            'num': i,
-            'filename': meta['filename'],
-            'display_name': display_name,
-            'page': meta['page_number'],
-            'text': html_lib.escape(result['document'])
-        })
-
-    safe_answer = html_lib.escape(answer_text)
-
-    # Strip bold markers the LLM sometimes produces
-    safe_answer = re.sub(r'\*\*(.+?)\*\*', r'\1', safe_answer)
-
-    # Bullet points
-    safe_answer = re.sub(r'^- (.+)$', r'<li>\1</li>', safe_answer, flags=re.MULTILINE)
-    safe_answer = re.sub(r'^(\* )(.+)$', r'<li>\2</li>', safe_answer, flags=re.MULTILINE)
-    safe_answer = re.sub(r'((?:<li>.*?</li>\n?)+)', r'<ul>\1</ul>', safe_answer)
 
-    # Numbered lists
-    safe_answer = re.sub(r'^(\d+)\. (.+)$', r'<li>\2</li>', safe_answer, flags=re.MULTILINE)
-
-    # [N] -> clickable citation pills
-    def replace_citation(match):
-        num = match.group(1)
-        return f'<span class="cite" onclick="showSource({num})">{num}</span>'
-
-    safe_answer = re.sub(r'\[(\d+)\]', replace_citation, safe_answer)
-
-    # Newlines -> paragraphs
-    paragraphs = safe_answer.split('\n')
-    formatted = []
-    for p in paragraphs:
-        p = p.strip()
-        if p and not p.startswith('<ul>') and not p.startswith('<li>') and not p.startswith('</ul>'):
-            formatted.append(f'<p>{p}</p>')
-        elif p:
-            formatted.append(p)
-    safe_answer = '\n'.join(formatted)
-
-    # Source cards HTML
-    source_cards_html = ""
-    for src in sources:
-        source_cards_html += f"""
-        <div class="source-card" id="source-{src['num']}">
-            <div class="source-header" onclick="toggleSource({src['num']})">
-                <div class="source-num">{src['num']}</div>
+# Static page shell and per-source card; only the $-placeholders change per query
+SOURCE_CARD_TEMPLATE = Template("""
+        <div class="source-card" id="source-$num">
+            <div class="source-header" onclick="toggleSource($num)">
+                <div class="source-num">$num</div>
                 <div class="source-meta">
-                    <div class="source-title">{src['display_name']}</div>
-                    <div class="source-page">Page {src['page']}</div>
+                    <div class="source-title">$display_name</div>
+                    <div class="source-page">Page $page</div>
                 </div>
-                <div class="source-chevron" id="chevron-{src['num']}">
+                <div class="source-chevron" id="chevron-$num">
                     <svg width="14" height="14" viewBox="0 0 16 16" fill="none">
                         <path d="M4 6L8 10L12 6" stroke="currentColor" stroke-width="1.5" stroke-linecap="round" stroke-linejoin="round"/>
                     </svg>
                 </div>
             </div>
-            <div class="source-body" id="body-{src['num']}">
-                <div class="source-text">{src['text']}</div>
-                <div class="source-file">{src['filename']}</div>
+            <div class="source-body" id="body-$num">
+                <div class="source-text">$text</div>
+                <div class="source-file">$filename</div>
             </div>
         </div>
-        """
+        """)
 
-    full_html = f"""
+ANSWER_SHELL_TEMPLATE = Template("""
     <!DOCTYPE html>
     <html>
     <head>
     <style>
-        * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-        body {{
+        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body {
             font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', sans-serif;
             color: #222;
             line-height: 1.7;
             font-size: 14.5px;
             background: transparent;
             -webkit-font-smoothing: antialiased;
-        }}
+        }
 
-        .answer-content {{
+        .answer-content {
             padding: 0 0 20px 0;
-        }}
-        .answer-content p {{
+        }
+        .answer-content p {
             margin-bottom: 8px;
-        }}
-        .answer-content ul {{
+        }
+        .answer-content ul {
             margin: 6px 0 10px 18px;
             padding: 0;
-        }}
-        .answer-content li {{
+        }
+        .answer-content li {
             margin-bottom: 5px;
             line-height: 1.6;
-        }}
+        }
 
-        .cite {{
+        .cite {
             display: inline-flex;
             align-items: center;
             justify-content: center;
@@ -124,58 +90,58 @@ def build_answer_html(answer_text: str, results: list) -> str:
             transition: all 0.15s ease;
             position: relative;
             top: -1px;
-        }}
-        .cite:hover {{
+        }
+        .cite:hover {
             background: #ddd;
             color: #333;
-        }}
-        .cite.active {{
+        }
+        .cite.active {
             background: #333;
             color: #fff;
-        }}
+        }
 
-        .sources-section {{
+        .sources-section {
             border-top: 1px solid #eee;
             padding-top: 16px;
             margin-top: 4px;
-        }}
-        .sources-label {{
+        }
+        .sources-label {
             font-size: 11px;
             font-weight: 500;
             color: #999;
             text-transform: uppercase;
             letter-spacing: 0.8px;
             margin-bottom: 10px;
-        }}
+        }
 
-        .source-card {{
+        .source-card {
             border: 1px solid #eee;
             border-radius: 8px;
             margin-bottom: 6px;
             overflow: hidden;
             transition: border-color 0.2s ease;
             background: #fff;
-        }}
-        .source-card:hover {{
+        }
+        .source-card:hover {
             border-color: #ccc;
-        }}
-        .source-card.highlighted {{
+        }
+        .source-card.highlighted {
             border-color: #333;
-        }}
+        }
 
-        .source-header {{
+        .source-header {
             display: flex;
             align-items: center;
             padding: 10px 14px;
             cursor: pointer;
             user-select: none;
             gap: 10px;
-        }}
-        .source-header:hover {{
+        }
+        .source-header:hover {
             background: #fafafa;
-        }}
+        }
 
-        .source-num {{
+        .source-num {
             display: flex;
             align-items: center;
             justify-content: center;
@@ -187,43 +153,43 @@ def build_answer_html(answer_text: str, results: list) -> str:
             font-size: 11px;
             font-weight: 500;
             flex-shrink: 0;
-        }}
+        }
 
-        .source-meta {{
+        .source-meta {
             flex: 1;
             min-width: 0;
-        }}
-        .source-title {{
+        }
+        .source-title {
             font-size: 13px;
             font-weight: 400;
             color: #333;
             white-space: nowrap;
             overflow: hidden;
             text-overflow: ellipsis;
-        }}
-        .source-page {{
+        }
+        .source-page {
             font-size: 11px;
             color: #999;
             margin-top: 1px;
-        }}
+        }
 
-        .source-chevron {{
+        .source-chevron {
             color: #999;
             transition: transform 0.2s ease;
             flex-shrink: 0;
-        }}
-        .source-chevron.open {{
+        }
+        .source-chevron.open {
             transform: rotate(180deg);
-        }}
+        }
 
-        .source-body {{
+        .source-body {
             display: none;
             padding: 0 14px 12px 44px;
-        }}
-        .source-body.open {{
+        }
+        .source-body.open {
             display: block;
-        }}
-        .source-text {{
+        }
+        .source-text {
             font-size: 12.5px;
             line-height: 1.55;
             color: #555;
@@ -234,67 +200,137 @@ def build_answer_html(answer_text: str, results: list) -> str:
             background: #fafafa;
             border-radius: 6px;
             border: 1px solid #f0f0f0;
-        }}
-        .source-file {{
+        }
+        .source-file {
             font-size: 11px;
             color: #aaa;
             margin-top: 6px;
-        }}
+        }
     </style>
     </head>
     <body>
         <div class="answer-content">
-            {safe_answer}
+            $ANSWER
         </div>
 
         <div class="sources-section">
             <div class="sources-label">Sources</div>
-            {source_cards_html}
+            $CARDS
         </div>
 
         <script>
-            function toggleSource(num) {{
+            function toggleSource(num) {
                 const body = document.getElementById('body-' + num);
                 const chevron = document.getElementById('chevron-' + num);
                 const isOpen = body.classList.contains('open');
-                if (isOpen) {{
+                if (isOpen) {
                     body.classList.remove('open');
                     chevron.classList.remove('open');
-                }} else {{
+                } else {
                     body.classList.add('open');
                     chevron.classList.add('open');
-                }}
-            }}
+                }
+            }
 
-            function showSource(num) {{
+            function showSource(num) {
                 const card = document.getElementById('source-' + num);
                 const body = document.getElementById('body-' + num);
                 const chevron = document.getElementById('chevron-' + num);
                 if (!card) return;
 
-                document.querySelectorAll('.source-card.highlighted').forEach(el => {{
+                document.querySelectorAll('.source-card.highlighted').forEach(el => {
                     el.classList.remove('highlighted');
-                }});
-                document.querySelectorAll('.cite.active').forEach(el => {{
+                });
+                document.querySelectorAll('.cite.active').forEach(el => {
                     el.classList.remove('active');
-                }});
+                });
 
                 event.target.classList.add('active');
 
-                if (!body.classList.contains('open')) {{
+                if (!body.classList.contains('open')) {
                     body.classList.add('open');
                     chevron.classList.add('open');
-                }}
+                }
 
                 card.classList.add('highlighted');
-                card.scrollIntoView({{ behavior: 'smooth', block: 'center' }});
+                card.scrollIntoView({ behavior: 'smooth', block: 'center' });
 
-                setTimeout(() => {{
+                setTimeout(() => {
                     card.classList.remove('highlighted');
-                }}, 2500);
-            }}
+                }, 2500);
+            }
+
+            // Report the rendered height to the hosting frame (answer_frame component)
+            new ResizeObserver(() => {
+                window.parent.postMessage({ type: 'setHeight', h: document.body.scrollHeight }, '*');
+            }).observe(document.body);
         </script>
     </body>
     </html>
-    """
-    return full_html
+    """)
+
+
+def replace_citation(match: re.Match) -> str:
+    """[N] -> clickable citation pill."""
+    num = match.group(1)
+    return f'<span class="cite" onclick="showSource({num})">{num}</span>'
+
+
+def replace_markup(match: re.Match) -> str:
+    """Dispatch one MARKUP_RE match on the branch that fired."""
+    kind = match.lastgroup
+    text = match.group(kind)
+    if kind == 'cite':
+        return f'<span class="cite" onclick="showSource({text})">{text}</span>'
+    if kind == 'bold':
+        # Strip bold markers the LLM sometimes produces
+        return CITE_RE.sub(replace_citation, text)
+    # Bullet or numbered list item; bold and citations inside it still apply
+    text = BOLD_RE.sub(r'\1', text)
+    return f'<li>{CITE_RE.sub(replace_citation, text)}</li>'
+
+
+@functools.lru_cache(maxsize=2048)
+def escape_cached(text: str) -> str:
+    """html.escape, memoized: the same chunks and filenames come back across queries."""
+    return html_lib.escape(text)
+
+
+@functools.lru_cache(maxsize=512)
+def display_name_for(filename: str) -> str:
+    """Escaped human-readable title for a PDF filename."""
+    return escape_cached(filename.replace('.pdf', '').replace('_', ' ').replace('-', ' '))
+
+
+def build_answer_html(answer_text: str, results: list) -> str:
+    """Return a full HTML document with the answer, clickable [N] citations, and collapsible source cards."""
+
+    safe_answer = html_lib.escape(answer_text)
+    safe_answer = MARKUP_RE.sub(replace_markup, safe_answer)
+    safe_answer = UL_WRAP_RE.sub(r'<ul>\1</ul>', safe_answer)
+
+    # Newlines -> paragraphs; a single-line answer with no list is one <p>
+    if '\n' not in safe_answer and '<ul>' not in safe_answer:
+        safe_answer = safe_answer.strip()
+        if safe_answer:
+            safe_answer = f'<p>{safe_answer}</p>'
+    else:
+        lines = (p.strip() for p in safe_answer.split('\n'))
+        safe_answer = '\n'.join(
+            p if p.startswith(('<ul>', '<li>', '</ul>')) else f'<p>{p}</p>'
+            for p in lines if p
+        )
+
+    # Source cards HTML
+    cards = []
+    for i, result in enumerate(results, 1):
+        meta = result['metadata']
+        cards.append(SOURCE_CARD_TEMPLATE.substitute(
+            num=i,
+            display_name=display_name_for(meta['filename']),
+            page=meta['page_number'],
+            text=escape_cached(result['document']),
+            filename=escape_cached(meta['filename']),
+        ))
+
+    return ANSWER_SHELL_TEMPLATE.substitute(ANSWER=safe_answer, CARDS=''.join(cards))
@@ -7,12 +7,19 @@ from dotenv import load_dotenv
 from typing import List, Dict
 import uuid
 
+from retrieve import brand_from_filename
+
 load_dotenv()
 
 
 class PDFIngestion:
     def __init__(self):
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        if os.getenv("STATIC_EMBEDDINGS") == "1":
+            # Must match the query side (see retrieve.StaticEmbedder)
+            from retrieve import StaticEmbedder
+            self.embedding_model = StaticEmbedder()
+        else:
+            self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
         self.tokenizer = tiktoken.get_encoding("cl100k_base")
 
         # Initialize local ChromaDB client
@@ -25,9 +32,10 @@ class PDFIngestion:
             self.collection = self.chroma_client.get_collection(name=self.collection_name)
             print(f"Using existing collection: {self.collection_name}")
         except:
+            # Cosine space: embeddings are stored unit-length, so HNSW ranks by inner product
             self.collection = self.chroma_client.create_collection(
                 name=self.collection_name,
-                metadata={"description": "HVAC technical documents"}
+                metadata={"description": "HVAC technical documents", "hnsw:space": "cosine"}
             )
             print(f"Created new collection: {self.collection_name}")
 
@@ -115,6 +123,8 @@ class PDFIngestion:
         metadatas = [
             {
                 'filename': chunk['filename'],
+                # Discrete lowercased brand, so brand filters are an exact match inside Chroma
+                'brand': brand_from_filename(chunk['filename']).lower(),
                 'page_number': str(chunk['page_number']),
                 'chunk_index': str(chunk['chunk_index'])
             }
@@ -124,7 +134,7 @@ class PDFIngestion:
 
 
         print("Generating embeddings...")
-        embeddings = self.embedding_model.encode(texts, show_progress_bar=True).tolist()
+        embeddings = self.embedding_model.encode(texts, show_progress_bar=True, normalize_embeddings=True)
 
 
         batch_size = 100
@@ -12,6 +12,12 @@ load_dotenv()
 OLLAMA_BASE_URL = "http://localhost:11434"
 OLLAMA_MODEL = "llama3.2:latest"
 
+# SYSTEM_PROMPT split once around its two placeholders, so building a prompt
+# is a plain concatenation instead of a str.format parse per query
+_PROMPT_PRE, _rest = SYSTEM_PROMPT.split("{context}", 1)
+_PROMPT_MID, _PROMPT_POST = _rest.split("{query}", 1)
+del _rest
+
 
 def get_groq_client() -> Groq:
     """Return a Groq client. Raises ValueError if API key is missing."""
@@ -33,9 +39,14 @@ def build_context(results: list) -> str:
     return "\n---\n".join(context_parts)
 
 
+def build_prompt(query: str, context: str) -> str:
+    """Fill SYSTEM_PROMPT with the retrieved context and the user's question."""
+    return f"{_PROMPT_PRE}{context}{_PROMPT_MID}{query}{_PROMPT_POST}"
+
+
 def generate_answer(query: str, context: str, groq_client: Groq) -> str:
     """Send query + context to Groq and return the answer."""
-    prompt = SYSTEM_PROMPT.format(context=context, query=query)
+    prompt = build_prompt(query, context)
 
     try:
         chat_completion = groq_client.chat.completions.create(
@@ -56,7 +67,7 @@ def generate_answer(query: str, context: str, groq_client: Groq) -> str:
 
 def generate_answer_ollama(query: str, context: str) -> str:
     """Send query + context to local Ollama and return the answer."""
-    prompt = SYSTEM_PROMPT.format(context=context, query=query)
+    prompt = build_prompt(query, context)
 
     try:
         response = requests.post(
@@ -1,28 +1,209 @@
 """Hybrid retrieval: vector search + BM25 + RRF + optional cross-encoder reranking."""
 
+import functools
+import hashlib
 import os
+import pickle
+import threading
 import time as _time
-from typing import List, Dict
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from typing import List, Dict, Optional
 
 import numpy as np
 from dotenv import load_dotenv
-from rank_bm25 import BM25Okapi
+import bm25s
 from sentence_transformers import SentenceTransformer
 import chromadb
 
-from config import RETRIEVAL_TOP_K, RETRIEVAL_CANDIDATE_K
+from config import RETRIEVAL_TOP_K, RETRIEVAL_CANDIDATE_K, SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD
 
 load_dotenv()
 
+EMBEDDING_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_model")
+BM25_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bm25_cache")
+
+
+class OnnxEmbedder:
+    """
+    all-MiniLM-L6-v2 on ONNX Runtime with dynamic INT8 quantization, for CPU query encoding.
+    Enabled with USE_ONNX=1. The model is exported and quantized once into ONNX_MODEL_DIR.
+    Needs `optimum[onnxruntime]`; vectors match SentenceTransformer's up to quantization error.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, max_length: int = 256):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        quantized_path = os.path.join(model_dir, "model_quantized.onnx")
+        if not os.path.exists(quantized_path):
+            self._export_quantized(model_dir)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ort.InferenceSession(quantized_path, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.max_length = max_length
+
+    @staticmethod
+    def _export_quantized(model_dir: str) -> None:
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+
+        print("Exporting all-MiniLM-L6-v2 to ONNX (INT8)...")
+        token = os.environ.get("HF_TOKEN")
+        model = ORTModelForFeatureExtraction.from_pretrained(EMBEDDING_MODEL_ID, export=True, token=token)
+        model.save_pretrained(model_dir)
+        AutoTokenizer.from_pretrained(EMBEDDING_MODEL_ID, token=token).save_pretrained(model_dir)
+        quantizer = ORTQuantizer.from_pretrained(model)
+        quantizer.quantize(
+            save_dir=model_dir,
+            quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False),
+        )
+
+    def encode(
+        self,
+        sentences,
+        batch_size: int = 32,
+        show_progress_bar: bool = False,
+        normalize_embeddings: bool = True,
+    ) -> np.ndarray:
+        """
+        Mean-pooled, L2-normalized embeddings, like SentenceTransformer.encode: a string
+        gives one vector, a list gives one row per sentence. Output is always normalized.
+        """
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        rows = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            feed = {name: inputs[name] for name in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+            mask = inputs["attention_mask"][:, :, None].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            rows.append(pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12))
+        embeddings = np.concatenate(rows) if rows else np.zeros((0, 384), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+
+class StaticEmbedder:
+    """
+    model2vec static embeddings (STATIC_EMBEDDINGS=1): a token lookup and mean, no
+    transformer pass, so encoding takes microseconds on CPU. Vectors live in a different
+    space (and dimension) than MiniLM's, so the collection must be ingested with the same
+    flag, e.g. into a separate CHROMA_COLLECTION_NAME. Needs `model2vec`.
+    """
+
+    MODEL_ID = "minishlab/potion-base-8M"
+
+    def __init__(self, model_id: str = MODEL_ID):
+        from model2vec import StaticModel
+
+        self.model = StaticModel.from_pretrained(model_id, token=os.environ.get("HF_TOKEN"))
+
+    def encode(
+        self,
+        sentences,
+        batch_size: int = 1024,
+        show_progress_bar: bool = False,
+        normalize_embeddings: bool = True,
+    ) -> np.ndarray:
+        """Same call shape as SentenceTransformer.encode; output is L2-normalized."""
+        embeddings = np.asarray(
+            self.model.encode(sentences, batch_size=batch_size, show_progress_bar=show_progress_bar),
+            dtype=np.float32,
+        )
+        norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+
+def brand_from_filename(filename: str) -> str:
+    """Brand of a document: its filename up to the first underscore or space, without .pdf."""
+    return filename.replace(".pdf", "").split("_")[0].split()[0]
+
+
+def _object_array(items) -> np.ndarray:
+    """1-D object array of items (never reshaped into 2-D, whatever the item type)."""
+    array = np.empty(len(items), dtype=object)
+    array[:] = list(items)
+    return array
+
+
+def _detect_device() -> str:
+    """Best available torch device: CUDA, then Apple MPS, else CPU (capped at 8 threads)."""
+    import torch
+
+    if torch.cuda.is_available():
+        return "cuda"
+    if torch.backends.mps.is_available():
+        return "mps"
+    # Small-batch MiniLM inference stops scaling past ~4-8 intra-op threads
+    torch.set_num_threads(min(8, os.cpu_count() or 1))
+    return "cpu"
+
+
+# Process-wide model and Chroma client, shared by every HybridRetriever so
+# per-request construction doesn't reload the model or reopen the database
+_embedding_model = None
+_chroma_client = None
+_singleton_lock = threading.Lock()
+_WARMUP_TEXT = "How do I troubleshoot low refrigerant pressure on a rooftop heat pump unit? " * 4
+
+
+def get_embedding_model():
+    """
+    The shared query encoder: model2vec with STATIC_EMBEDDINGS=1, ONNX INT8 with
+    USE_ONNX=1, else SentenceTransformer.
+    """
+    global _embedding_model
+    if _embedding_model is None:
+        with _singleton_lock:
+            if _embedding_model is None:
+                if os.getenv("STATIC_EMBEDDINGS") == "1":
+                    model = StaticEmbedder()
+                elif os.getenv("USE_ONNX") == "1":
+                    model = OnnxEmbedder()
+                else:
+                    model = SentenceTransformer(
+                        "all-MiniLM-L6-v2", token=os.environ.get("HF_TOKEN"), device=_detect_device()
+                    )
+                # The first encode pays one-time kernel selection and allocator warmup;
+                # take it here (short and medium input) instead of on the first user query
+                model.encode("warmup", normalize_embeddings=True)
+                model.encode(_WARMUP_TEXT, normalize_embeddings=True)
+                _embedding_model = model
+    return _embedding_model
+
+
+def get_chroma_client():
+    """The shared PersistentClient for ./chroma_db."""
+    global _chroma_client
+    if _chroma_client is None:
+        with _singleton_lock:
+            if _chroma_client is None:
+                chroma_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chroma_db")
+                _chroma_client = chromadb.PersistentClient(path=chroma_path)
+    return _chroma_client
+
 
 class HybridRetriever:
+    # reciprocal_rank_fusion switches to numpy at this many combined results
+    RRF_NUMPY_MIN = 128
+
     def __init__(self):
-        self.embedding_model = SentenceTransformer(
-            "all-MiniLM-L6-v2", token=os.environ.get("HF_TOKEN")
-        )
+        self.embedding_model = get_embedding_model()
+        # Per-instance memo of query embeddings (see _embed)
+        self._encode_cached = functools.lru_cache(maxsize=1024)(self._encode_query)
 
-        chroma_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chroma_db")
-        self.chroma_client = chromadb.PersistentClient(path=chroma_path)
+        self.chroma_client = get_chroma_client()
 
         self.collection_name = os.getenv("CHROMA_COLLECTION_NAME", "hvac_documents")
         try:
@@ -35,83 +216,282 @@ class HybridRetriever:
         self.all_documents = None
         self.all_metadatas = None
         self.all_ids = None
+        # brand filter (lowercased, "" for none) -> (bm25, documents, metadatas, ids)
+        self._bm25_by_brand: Dict[str, tuple] = {}
+
+        # Recent (unit query embedding, search params, results), newest last
+        self._result_cache = deque(maxlen=SEMANTIC_CACHE_SIZE)
+        self._cache_lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="retrieve")
+        self._brands_cache: Optional[List[str]] = None
+        # Filenames of a collection ingested without the brand field, () when it has one
+        self._legacy_filenames: Optional[tuple] = None
+
+    def _encode_query(self, text: str) -> np.ndarray:
+        # Unit float32 vector, normalized inside encode; read-only since it is cached and shared
+        embedding = self.embedding_model.encode(text, normalize_embeddings=True).astype(np.float32, copy=False)
+        embedding.setflags(write=False)
+        return embedding
+
+    def _embed(self, text: str) -> np.ndarray:
+        """
+        Embed a query, reusing the vector for repeated queries (re-runs, example buttons).
+        all-MiniLM-L6-v2 is uncased, so keying on stripped lowercase text is lossless.
+        The numpy vector goes to Chroma as is, with no list conversion.
+        """
+        return self._encode_cached(text.strip().lower())
+
+    def _cached_results(self, embedding: np.ndarray, params: tuple):
+        """Results of a recent search with the same params and a near-identical query, else None."""
+        with self._cache_lock:
+            entries = [entry for entry in self._result_cache if entry[1] == params]
+        if not entries:
+            return None
+        sims = np.stack([entry[0] for entry in entries]) @ embedding
+        best = int(np.argmax(sims))
+        if sims[best] < SEMANTIC_CACHE_THRESHOLD:
+            return None
+        # Per-dict copies: callers and rerank mutate result dicts
+        return [dict(result) for result in entries[best][2]]
+
+    def _brand_where(self, brand_filter: str = None) -> Optional[Dict]:
+        """
+        Chroma where clause for brand_filter: an exact match on the lowercased brand field
+        written at ingest (string $contains matches nothing in Chroma). Collections ingested
+        before that field existed (detected once, from one sample record) are matched on
+        the filenames of that brand instead.
+        """
+        if not brand_filter:
+            return None
+        if self._legacy_filenames is None:
+            with self._cache_lock:
+                if self._legacy_filenames is None:
+                    sample = self.collection.get(limit=1, include=["metadatas"])["metadatas"]
+                    legacy = ()
+                    if sample and "brand" not in sample[0]:
+                        results = self.collection.get(include=["metadatas"])
+                        legacy = tuple(sorted({meta["filename"] for meta in results["metadatas"]}))
+                    self._legacy_filenames = legacy
+        brand = brand_filter.lower()
+        names = [fn for fn in self._legacy_filenames if brand_from_filename(fn).lower() == brand]
+        # $in needs a non-empty list; with no file of that brand the brand clause matches nothing
+        return {"filename": {"$in": names}} if names else {"brand": brand}
+
+    def _collection_fingerprint(self) -> str:
+        """
+        sha1 of the sorted chunk ids. Ingest assigns fresh uuid4 ids, so this changes on any
+        re-ingest, including one that keeps the chunk count.
+        """
+        ids = self.collection.get(include=[])["ids"]
+        return hashlib.sha1("\n".join(sorted(ids)).encode()).hexdigest()[:16]
 
-    def _load_bm25_index(self, brand_filter: str = None):
-        """Build BM25 index from ChromaDB documents, with optional filename filter."""
+    def _load_bm25_index(self, brand_filter: str = None) -> tuple:
+        """
+        Return the (bm25, documents, metadatas, ids) index for brand_filter. Indexes are kept
+        per brand in memory and pickled to BM25_CACHE_DIR, keyed by collection ids, so cold
+        starts and brand switches skip the full ChromaDB read and tokenization.
+        The lock covers only selecting (or building) the index; searches run on the returned
+        tuple, so concurrent sessions with different brands never wait on each other.
+        """
+        brand_key = brand_filter.lower() if brand_filter else ""
+        with self._cache_lock:
+            index = self._bm25_by_brand.get(brand_key)
+            if index is None:
+                # Keyed by the collection's ids, not its size: a pickle from an earlier
+                # ingest would fuse BM25 ids that the vector branch never returns
+                fingerprint = self._collection_fingerprint()
+                digest = hashlib.sha1(brand_key.encode()).hexdigest()[:12]
+                cache_path = os.path.join(BM25_CACHE_DIR, f"bm25s_{self.collection_name}_{fingerprint}_{digest}.pkl")
+                try:
+                    with open(cache_path, "rb") as f:
+                        index = pickle.load(f)
+                    print(f"BM25 index loaded from {cache_path}")
+                except Exception:
+                    # Missing, truncated, or pickled by another bm25s/numpy version: rebuild
+                    index = self._build_bm25_index(brand_filter)
+                    os.makedirs(BM25_CACHE_DIR, exist_ok=True)
+                    with open(cache_path, "wb") as f:
+                        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+                bm25, documents, metadatas, ids = index
+                # Object arrays let bm25_search gather the top-k rows with one fancy index
+                index = (bm25, _object_array(documents), _object_array(metadatas), _object_array(ids))
+                self._bm25_by_brand[brand_key] = index
+
+            # Kept current for callers of bm25_search without an explicit index
+            self.bm25, self.all_documents, self.all_metadatas, self.all_ids = index
+        return index
+
+    def _build_bm25_index(self, brand_filter: str = None):
+        """Build (bm25, documents, metadatas, ids) from ChromaDB documents, with optional brand filter."""
         print("Loading documents for BM25 indexing...")
 
-        results = self.collection.get(include=["documents", "metadatas"])
+        results = self.collection.get(where=self._brand_where(brand_filter), include=["documents", "metadatas"])
+        if brand_filter and not results["ids"]:
+            print(f"Warning: no documents found for brand '{brand_filter}'")
+
         documents = results["documents"]
         metadatas = results["metadatas"]
         ids = results["ids"]
 
-        if brand_filter:
-            filtered = [
-                (doc, meta, doc_id)
-                for doc, meta, doc_id in zip(documents, metadatas, ids)
-                if brand_filter.lower() in meta.get("filename", "").lower()
-            ]
-            if filtered:
-                documents, metadatas, ids = zip(*filtered)
-                documents, metadatas, ids = list(documents), list(metadatas), list(ids)
-            else:
-                print(f"Warning: no documents found for brand '{brand_filter}'")
-                documents, metadatas, ids = [], [], []
-
-        self.all_documents = documents
-        self.all_metadatas = metadatas
-        self.all_ids = ids
-
-        tokenized = [doc.lower().split() for doc in documents]
-        self.bm25 = BM25Okapi(tokenized)
+        # Same whitespace/lowercase tokens as before; bm25s precomputes the sparse
+        # token x document score matrix, so a query is a row gather + sum.
+        # Okapi k1/b kept; lucene IDF is the always-positive variant.
+        tokenized = self._tokenize_documents(ids, documents)
+        bm25 = None
+        if tokenized:
+            bm25 = bm25s.BM25(method="lucene", k1=1.5, b=0.75)
+            bm25.index(tokenized, show_progress=False)
         print(f"BM25 index built with {len(documents)} documents")
+        return bm25, documents, metadatas, ids
+
+    def _tokenize_documents(self, ids: List[str], documents: List[str]) -> List[List[str]]:
+        """
+        BM25 tokens per document. Tokens are persisted by chunk id (ids never change for a
+        chunk), so after the collection grows only the newly ingested chunks are tokenized.
+        Entries for chunks that left the collection are dropped whenever the cache is rewritten.
+        """
+        cache_path = os.path.join(BM25_CACHE_DIR, f"tokens_{self.collection_name}.pkl")
+        try:
+            with open(cache_path, "rb") as f:
+                token_cache: Dict[str, List[str]] = pickle.load(f)
+        except Exception:
+            token_cache = {}
+
+        tokenized = []
+        new_tokens = 0
+        for doc_id, doc in zip(ids, documents):
+            tokens = token_cache.get(doc_id)
+            if tokens is None:
+                tokens = token_cache[doc_id] = doc.lower().split()
+                new_tokens += 1
+            tokenized.append(tokens)
+
+        if new_tokens:
+            print(f"Tokenized {new_tokens} new documents for BM25")
+            # Re-ingests assign new ids; drop chunks no longer in the collection (any brand)
+            live_ids = set(self.collection.get(include=[])["ids"])
+            token_cache = {doc_id: tokens for doc_id, tokens in token_cache.items() if doc_id in live_ids}
+            os.makedirs(BM25_CACHE_DIR, exist_ok=True)
+            with open(cache_path, "wb") as f:
+                pickle.dump(token_cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return tokenized
+
+    @staticmethod
+    def _vector_hits(results: Dict, row: int = 0) -> List[Dict]:
+        """Result dicts for one query row of a collection.query response."""
+        similarities = (1.0 - np.asarray(results["distances"][row], dtype=np.float64)).tolist()
+        return [
+            {
+                "id": doc_id,
+                "document": document,
+                "metadata": metadata,
+                "score": score,
+                "method": "vector",
+            }
+            for doc_id, document, metadata, score in zip(
+                results["ids"][row],
+                results["documents"][row],
+                results["metadatas"][row],
+                similarities,
+            )
+        ]
+
+    def _vector_query(self, query: str, top_k: int, brand_filter: str = None, include=None) -> Dict:
+        """Raw collection.query response for one query."""
+        return self.collection.query(
+            query_embeddings=[self._embed(query)],
+            n_results=top_k,
+            where=self._brand_where(brand_filter),
+            include=include or ["documents", "metadatas", "distances"],
+        )
 
     def vector_search(self, query: str, top_k: int = RETRIEVAL_CANDIDATE_K, brand_filter: str = None) -> List[Dict]:
         """Semantic search via ChromaDB embeddings."""
-        query_embedding = self.embedding_model.encode(query).tolist()
+        return self._vector_hits(self._vector_query(query, top_k, brand_filter))
 
-        where_filter = None
-        if brand_filter:
-            where_filter = {"filename": {"$contains": brand_filter.lower()}}
+    def batch_vector_search(
+        self,
+        queries: List[str],
+        top_k: int = RETRIEVAL_CANDIDATE_K,
+        brand_filter: str = None,
+    ) -> List[List[Dict]]:
+        """vector_search for several queries: one batched encode and one Chroma query."""
+        if not queries:
+            return []
+        embeddings = self.embedding_model.encode(
+            queries,
+            batch_size=min(len(queries), 32),
+            show_progress_bar=False,
+            normalize_embeddings=True,
+        )
 
+        where_filter = self._brand_where(brand_filter)
         results = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=embeddings,
             n_results=top_k,
             where=where_filter,
             include=["documents", "metadatas", "distances"],
         )
+        return [self._vector_hits(results, row) for row in range(len(queries))]
 
-        return [
-            {
-                "id": results["ids"][0][i],
-                "document": results["documents"][0][i],
-                "metadata": results["metadatas"][0][i],
-                "score": 1 - results["distances"][0][i],
-                "method": "vector",
-            }
-            for i in range(len(results["documents"][0]))
-        ]
-
-    def bm25_search(self, query: str, top_k: int = RETRIEVAL_CANDIDATE_K) -> List[Dict]:
-        """Keyword search via BM25."""
-        if not self.bm25 or not self.all_documents:
+    def _bm25_ranks(self, query: str, top_k: int, index: tuple = None):
+        """(row indices into index, default the active one, and scores), best first, zero scores dropped."""
+        bm25, documents = index[:2] if index is not None else (self.bm25, self.all_documents)
+        if bm25 is None or documents is None or len(documents) == 0:
             raise Exception("BM25 index not loaded.")
 
-        scores = self.bm25.get_scores(query.lower().split())
-        top_indices = np.argsort(scores)[::-1][:top_k]
-
+        empty = np.empty(0, dtype=np.intp), np.empty(0)
+        query_tokens = query.lower().split()
+        # No query token in the corpus vocabulary: every score would be 0
+        vocab = bm25.vocab_dict
+        if not any(token in vocab for token in query_tokens):
+            return empty
+
+        scores = bm25.get_scores(query_tokens)
+        # Partition out the top k in O(N), then sort only those k
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return empty
+        top_indices = np.argpartition(scores, -k)[-k:]
+        top_indices = top_indices[np.argsort(scores[top_indices])[::-1]]
+
+        top_scores = scores[top_indices]
+        matched = top_scores > 0
+        return top_indices[matched], top_scores[matched]
+
+    def bm25_search(self, query: str, top_k: int = RETRIEVAL_CANDIDATE_K, index: tuple = None) -> List[Dict]:
+        """Keyword search via BM25, on index from _load_bm25_index or else the active one."""
+        if index is None:
+            index = (self.bm25, self.all_documents, self.all_metadatas, self.all_ids)
+        _, documents, metadatas, ids = index
+        selected, scores = self._bm25_ranks(query, top_k, index)
+        # Gather each column for the survivors at once
         return [
             {
-                "id": self.all_ids[idx],
-                "document": self.all_documents[idx],
-                "metadata": self.all_metadatas[idx],
-                "score": float(scores[idx]),
+                "id": doc_id,
+                "document": document,
+                "metadata": metadata,
+                "score": score,
                 "method": "bm25",
             }
-            for idx in top_indices
-            if scores[idx] > 0
+            for doc_id, document, metadata, score in zip(
+                ids[selected],
+                documents[selected],
+                metadatas[selected],
+                scores.tolist(),
+            )
         ]
 
+    @staticmethod
+    def _fuse_ranks(vector_ids: List[str], bm25_ids: List[str], k: int = 60, limit: int = None) -> List[tuple]:
+        """RRF over two ranked id lists: [(id, score)] best first, ties in first-appearance order."""
+        scores: Dict[str, float] = defaultdict(float)
+        for ranked in (vector_ids, bm25_ids):
+            for rank, doc_id in enumerate(ranked, start=1):
+                scores[doc_id] += 1 / (k + rank)
+        fused = sorted(scores.items(), key=itemgetter(1), reverse=True)
+        return fused if limit is None else fused[:limit]
+
     def reciprocal_rank_fusion(
         self,
         vector_results: List[Dict],
@@ -119,23 +499,45 @@ class HybridRetriever:
         k: int = 60,
     ) -> List[Dict]:
         """Merge vector and BM25 results. score = sum(1 / (k + rank)) across both lists."""
-        rrf_scores: Dict[str, Dict] = {}
+        merged = vector_results + bm25_results
+        if not merged:
+            return []
 
-        for rank, result in enumerate(vector_results, start=1):
-            doc_id = result["id"]
-            if doc_id not in rrf_scores:
-                rrf_scores[doc_id] = {"score": 0, "document": result["document"], "metadata": result["metadata"]}
-            rrf_scores[doc_id]["score"] += 1 / (k + rank)
+        if len(merged) < self.RRF_NUMPY_MIN:
+            # Small inputs (the usual 2 x RETRIEVAL_CANDIDATE_K): plain dicts beat array setup
+            payload: Dict[str, Dict] = {}
+            for result in merged:
+                payload.setdefault(result["id"], result)
+            fused = self._fuse_ranks(
+                [result["id"] for result in vector_results], [result["id"] for result in bm25_results], k=k
+            )
+            return [
+                {"id": doc_id, "document": payload[doc_id]["document"], "metadata": payload[doc_id]["metadata"],
+                 "rrf_score": score}
+                for doc_id, score in fused
+            ]
 
-        for rank, result in enumerate(bm25_results, start=1):
-            doc_id = result["id"]
-            if doc_id not in rrf_scores:
-                rrf_scores[doc_id] = {"score": 0, "document": result["document"], "metadata": result["metadata"]}
-            rrf_scores[doc_id]["score"] += 1 / (k + rank)
+        # Vector ranks then BM25 ranks, summed per unique id in one np.add.at
+        contributions = np.concatenate((
+            1.0 / (k + np.arange(1, len(vector_results) + 1)),
+            1.0 / (k + np.arange(1, len(bm25_results) + 1)),
+        ))
+        unique_ids, first_seen, inverse = np.unique(
+            [result["id"] for result in merged], return_index=True, return_inverse=True
+        )
+        totals = np.zeros(len(unique_ids))
+        np.add.at(totals, inverse, contributions)
 
+        # Highest score first; ties keep first-appearance order
+        order = np.lexsort((first_seen, -totals))
         return [
-            {"id": doc_id, "document": data["document"], "metadata": data["metadata"], "rrf_score": data["score"]}
-            for doc_id, data in sorted(rrf_scores.items(), key=lambda x: x[1]["score"], reverse=True)
+            {
+                "id": merged[first_seen[i]]["id"],
+                "document": merged[first_seen[i]]["document"],
+                "metadata": merged[first_seen[i]]["metadata"],
+                "rrf_score": float(totals[i]),
+            }
+            for i in order
         ]
 
     def hybrid_search(
@@ -148,22 +550,87 @@ class HybridRetriever:
         """
         Run vector + BM25 search, merge with RRF, optionally rerank with cross-encoder.
         Pass a loaded CrossEncoder to reranker to enable reranking.
+        With SEMANTIC_CACHE=1, near-identical queries are answered from the semantic result cache.
         """
-        if self.bm25 is None or brand_filter:
-            self._load_bm25_index(brand_filter)
-
-        if not self.all_documents:
+        embedding = None
+        if SEMANTIC_CACHE_SIZE:
+            # The ids fingerprint in the key drops cached results after any re-ingest
+            params = (top_k, brand_filter, id(reranker) if reranker is not None else None, self._collection_fingerprint())
+            embedding = self._embed(query)
+            cached = self._cached_results(embedding, params)
+            if cached is not None:
+                return cached
+
+        index = self._load_bm25_index(brand_filter)
+        _, documents, metadatas, ids = index
+        if len(documents) == 0:
             return []
 
-        vector_results = self.vector_search(query, top_k=RETRIEVAL_CANDIDATE_K, brand_filter=brand_filter)
-        bm25_results = self.bm25_search(query, top_k=RETRIEVAL_CANDIDATE_K)
-        candidates = self.reciprocal_rank_fusion(vector_results, bm25_results)
+        # Chroma query and BM25 scoring are independent; overlap them. Each branch
+        # yields only ranked ids; result dicts are built once, for the survivors.
+        vector_future = self._executor.submit(
+            self._vector_query, query, RETRIEVAL_CANDIDATE_K, brand_filter, ["documents", "metadatas"]
+        )
+        bm25_rows, _ = self._bm25_ranks(query, RETRIEVAL_CANDIDATE_K, index)
+        bm25_ids = ids[bm25_rows].tolist()
+        vector_raw = vector_future.result()
+
+        vector_ids = vector_raw["ids"][0]
+        # First occurrence wins, vector before BM25, as in reciprocal_rank_fusion
+        payload = {doc_id: (doc, meta) for doc_id, doc, meta in zip(
+            bm25_ids, documents[bm25_rows], metadatas[bm25_rows]
+        )}
+        payload.update(zip(vector_ids, zip(vector_raw["documents"][0], vector_raw["metadatas"][0])))
+
+        # The reranker needs every candidate; without it only the top k are materialized
+        fused = self._fuse_ranks(vector_ids, bm25_ids, limit=None if reranker is not None else top_k)
+        candidates = [
+            {"id": doc_id, "document": payload[doc_id][0], "metadata": payload[doc_id][1], "rrf_score": score}
+            for doc_id, score in fused
+        ]
 
         if reranker is not None:
             from rerank import rerank
             candidates = rerank(query, candidates, reranker)
 
-        return candidates[:top_k]
+        results = candidates[:top_k]
+        if embedding is not None:
+            with self._cache_lock:
+                self._result_cache.append((embedding, params, [dict(result) for result in results]))
+        return results
+
+    def batch_hybrid_search(
+        self,
+        queries: List[str],
+        top_k: int = RETRIEVAL_TOP_K,
+        brand_filter: str = None,
+        reranker=None,
+    ) -> List[List[Dict]]:
+        """
+        hybrid_search for several queries at once (multi-query / HyDE flows).
+        Queries are embedded in one batch and sent to Chroma in one call, overlapped
+        with per-query BM25 scoring. Returns one result list per query, in order.
+        """
+        index = self._load_bm25_index(brand_filter)
+        if len(index[1]) == 0:
+            return [[] for _ in queries]
+
+        vector_future = self._executor.submit(
+            self.batch_vector_search, queries, RETRIEVAL_CANDIDATE_K, brand_filter
+        )
+        bm25_lists = [self.bm25_search(query, top_k=RETRIEVAL_CANDIDATE_K, index=index) for query in queries]
+        vector_lists = vector_future.result()
+
+        if reranker is not None:
+            from rerank import rerank
+
+        batch_results = []
+        for query, vector_results, bm25_results in zip(queries, vector_lists, bm25_lists):
+            candidates = self.reciprocal_rank_fusion(vector_results, bm25_results)
+            if reranker is not None:
+                candidates = rerank(query, candidates, reranker)
+            batch_results.append(candidates[:top_k])
+        return batch_results
 
     def hybrid_search_timed(
         self,
@@ -172,18 +639,22 @@ class HybridRetriever:
         brand_filter: str = None,
         reranker=None,
     ) -> Dict:
-        """Same as hybrid_search but returns timing data alongside results."""
-        if self.bm25 is None or brand_filter:
-            self._load_bm25_index(brand_filter)
+        """
+        Same as hybrid_search but returns timing data alongside results. Bypasses the
+        embedding memo and the semantic result cache so the timings measure real work.
+        """
+        index = self._load_bm25_index(brand_filter)
 
-        if not self.all_documents:
+        if len(index[1]) == 0:
             return {"results": [], "timings": {"embed_ms": 0, "search_ms": 0, "rerank_ms": 0}}
 
+        # Encoded directly, not through the _embed memo, so repeated eval questions
+        # report real encode time instead of a cache hit
         embed_start = _time.perf_counter()
-        query_embedding = self.embedding_model.encode(query).tolist()
+        query_embedding = self._encode_query(query)
         embed_ms = (_time.perf_counter() - embed_start) * 1000
 
-        where_filter = {"filename": {"$contains": brand_filter.lower()}} if brand_filter else None
+        where_filter = self._brand_where(brand_filter)
 
         search_start = _time.perf_counter()
         vs_raw = self.collection.query(
@@ -192,17 +663,8 @@ class HybridRetriever:
             where=where_filter,
             include=["documents", "metadatas", "distances"],
         )
-        vector_results = [
-            {
-                "id": vs_raw["ids"][0][i],
-                "document": vs_raw["documents"][0][i],
-                "metadata": vs_raw["metadatas"][0][i],
-                "score": 1 - vs_raw["distances"][0][i],
-                "method": "vector",
-            }
-            for i in range(len(vs_raw["documents"][0]))
-        ]
-        bm25_results = self.bm25_search(query, top_k=RETRIEVAL_CANDIDATE_K)
+        vector_results = self._vector_hits(vs_raw)
+        bm25_results = self.bm25_search(query, top_k=RETRIEVAL_CANDIDATE_K, index=index)
         search_ms = (_time.perf_counter() - search_start) * 1000
 
         rerank_start = _time.perf_counter()
@@ -223,11 +685,24 @@ class HybridRetriever:
         }
 
     def get_available_brands(self) -> List[str]:
-        """Return sorted unique brand names derived from filenames in the collection."""
-        results = self.collection.get(include=["metadatas"])
-        filenames = {meta["filename"] for meta in results["metadatas"]}
-        brands = {fn.replace(".pdf", "").split("_")[0].split()[0] for fn in filenames}
-        return sorted(brands)
+        """
+        Return sorted unique brand names derived from filenames in the collection.
+        Computed once per retriever; call refresh_brands() after ingesting new documents.
+        """
+        if self._brands_cache is None:
+            with self._cache_lock:
+                if self._brands_cache is None:
+                    results = self.collection.get(include=["metadatas"])
+                    filenames = {meta["filename"] for meta in results["metadatas"]}
+                    self._brands_cache = sorted({brand_from_filename(fn) for fn in filenames})
+        return list(self._brands_cache)
+
+    def refresh_brands(self) -> List[str]:
+        """Drop the cached brand list (and brand-filter lookup) and rescan the collection."""
+        with self._cache_lock:
+            self._brands_cache = None
+            self._legacy_filenames = None
+        return self.get_available_brands()
 
 
 if __name__ == "__main__":
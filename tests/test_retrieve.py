@@ -0,0 +1,46 @@
+"""Brand-filtered retrieval against a small collection ingested from generated PDFs."""
+
+import chromadb
+import fitz
+import pytest
+
+import ingest
+import retrieve
+
+DOCUMENTS = {
+    "Daikin_VRV_Service_Manual.pdf": "Daikin VRV outdoor units use R32 refrigerant and inverter compressors.",
+    "Carrier Chiller Guide.pdf": "Carrier chillers need annual condenser coil cleaning and refrigerant checks.",
+}
+
+
+@pytest.fixture
+def retriever(tmp_path, monkeypatch):
+    data_folder = tmp_path / "data"
+    data_folder.mkdir()
+    for filename, text in DOCUMENTS.items():
+        doc = fitz.open()
+        doc.new_page().insert_text((72, 72), text)
+        doc.save(str(data_folder / filename))
+        doc.close()
+
+    # Ingest and retrieval share one throwaway database and BM25 cache
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma_db"))
+    monkeypatch.setattr(ingest.chromadb, "PersistentClient", lambda path: client)
+    monkeypatch.setattr(retrieve, "_chroma_client", client)
+    monkeypatch.setattr(retrieve, "BM25_CACHE_DIR", str(tmp_path / "bm25_cache"))
+    monkeypatch.setenv("CHROMA_COLLECTION_NAME", "brand_filter_test")
+
+    ingest.PDFIngestion().ingest_documents(str(data_folder))
+    return retrieve.HybridRetriever()
+
+
+def test_brand_filtered_hybrid_search_returns_hits(retriever):
+    results = retriever.hybrid_search("refrigerant", top_k=5, brand_filter="Daikin")
+    assert results
+    assert {r["metadata"]["filename"] for r in results} == {"Daikin_VRV_Service_Manual.pdf"}
+
+
+def test_brand_filtered_vector_search_returns_hits(retriever):
+    results = retriever.vector_search("condenser coil cleaning", top_k=5, brand_filter="carrier")
+    assert results
+    assert {r["metadata"]["filename"] for r in results} == {"Carrier Chiller Guide.pdf"}